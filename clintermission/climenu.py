@@ -1,13 +1,15 @@
 # Written by Sebastian Lohff <seba@someserver.de>
 # Licensed under Apache License 2.0
+import asyncio
+
 from prompt_toolkit.application import Application
-from prompt_toolkit.application.current import create_app_session
+from prompt_toolkit.application.current import create_app_session, get_app
 from prompt_toolkit.buffer import Buffer
 from prompt_toolkit.document import Document
-from prompt_toolkit.filters import is_searching
+from prompt_toolkit.filters import Condition, is_searching
 from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.layout import Layout, Window, HSplit
-from prompt_toolkit.layout.controls import BufferControl
+from prompt_toolkit.layout import ConditionalContainer, Layout, Window, HSplit
+from prompt_toolkit.layout.controls import BufferControl, FormattedTextControl
 from prompt_toolkit.layout.processors import Processor, Transformation
 from prompt_toolkit.output.defaults import create_output
 from prompt_toolkit import search
@@ -108,6 +110,7 @@ class CliMenu:
         self._header_indent = indent
         self._dedent_selection = dedent_selection
         self._right_pad_options = right_pad_options
+        self._status = ''
 
         self._cursor = cursor if cursor is not None else self.default_cursor
         self._style = style if style is not None else self.default_style
@@ -152,6 +155,14 @@ class CliMenu:
 
         return self._success
 
+    def set_status(self, text):
+        """Set a status text shown below the menu, can be updated while the menu is running"""
+        self._status = text
+        get_app().invalidate()
+
+    def _get_status_text(self):
+        return self._status
+
     def get_options(self):
         return [_item for _item in self._items if isinstance(_item, _CliMenuOption)]
 
@@ -343,9 +354,13 @@ class CliMenu:
                                       search_buffer_control=self._searchbar.control,
                                       preview_search=True,
                                       input_processors=[MenuColorizer()])
+        status = Window(FormattedTextControl(lambda: [(self._style.text, self._get_status_text())]),
+                        wrap_lines=True,
+                        dont_extend_height=True)
         split = HSplit([Window(self._bufctrl,
                                wrap_lines=True,
                                always_hide_cursor=True),
+                        ConditionalContainer(status, filter=Condition(lambda: bool(self._get_status_text()))),
                         self._searchbar])
 
         # set initial pos
@@ -367,15 +382,39 @@ class CliMenu:
 
 
 class CliMultiMenu(CliMenu):
+    """Menu to select multiple items
+
+    min_selection_count/max_selection_count limit how many items can be selected. Selecting more than
+    max_selection_count items is refused with a message shown below the menu.
+
+    selection_validator(added, removed, selected) is called before each selection change with lists of
+    (num, item) tuples, selected being the current selection without the change. It can refuse the change by
+    returning False. Refusals show no message unless the validator calls set_status().
+
+    selection_callback(added, removed) is called with lists of (num, item) tuples of all items
+    selected/deselected since its last call. The initially selected items are passed as added when the menu
+    starts. Changes are delivered after selection_callback_delay seconds without further changes
+    (immediately if 0). Changes still pending when the menu is closed are delivered after it has been closed.
+    """
     default_selection_icons = CliSelectionStyle.SQUARE_BRACKETS
 
     @classmethod
     def set_default_selector_icons(cls, selection_icons):
         cls.default_selection_icons = selection_icons
 
-    def __init__(self, *args, selection_icons=None, min_selection_count=0, **kwargs):
-        self._multi_selected = []
+    def __init__(self, *args, selection_icons=None, min_selection_count=0, max_selection_count=None,
+                 selection_validator=None, selection_callback=None, selection_callback_delay=0.2, **kwargs):
+        # selected line numbers, a dict is used as an ordered set
+        self._multi_selected = {}
         self._min_selection_count = min_selection_count
+        self._max_selection_count = max_selection_count
+        self._selection_validator = selection_validator
+        self._selection_error = ''
+        self._selection_callback = selection_callback
+        self._selection_callback_delay = selection_callback_delay
+        self._selection_callback_handle = None
+        # maps line number -> selection state before the first change since the last callback
+        self._selection_changes = {}
         self._selection_icons = selection_icons if selection_icons is not None else self.default_selection_icons
         super().__init__(*args, **kwargs)
 
@@ -387,7 +426,7 @@ class CliMultiMenu(CliMenu):
         self._items[-1].selected_style = selected_style
         self._items[-1].selected_highlighted_style = selected_highlighted_style
         if selected:
-            self._multi_selected.append(len(self._items) - 1)
+            self._multi_selected[len(self._items) - 1] = None
 
     def get_selection(self):
         if self.success:
@@ -411,10 +450,79 @@ class CliMultiMenu(CliMenu):
         @kb.add('space', filter=~is_searching)
         @kb.add('right', filter=~is_searching)
         def mark(event):
-            if self._pos not in self._multi_selected:
-                self._multi_selected.append(self._pos)
+            self._set_selected([self._pos], self._pos not in self._multi_selected)
+
+    def _set_selected(self, lines, selected):
+        """Select or deselect all given lines, recording the changes for the selection callback
+
+        Returns False without changing anything if this would exceed max_selection_count or
+        the selection validator refuses the change.
+        """
+        self._selection_error = ''
+        lines = [line for line in lines if (line in self._multi_selected) != selected]
+        if not lines:
+            return True
+
+        if selected and self._max_selection_count is not None and \
+                len(self._multi_selected) + len(lines) > self._max_selection_count:
+            self._selection_error = "A maximum of {} items can be selected".format(self._max_selection_count)
+            return False
+
+        if self._selection_validator is not None:
+            delta = [(self._items[line].num, self._items[line].item) for line in lines]
+            added, removed = (delta, []) if selected else ([], delta)
+            current = [(self._items[n].num, self._items[n].item) for n in self._multi_selected]
+            if not self._selection_validator(added, removed, current):
+                return False
+
+        for line in lines:
+            self._selection_changes.setdefault(line, not selected)
+            if selected:
+                self._multi_selected[line] = None
             else:
-                self._multi_selected.remove(self._pos)
+                del self._multi_selected[line]
+
+        self._schedule_selection_callback()
+        return True
+
+    def _schedule_selection_callback(self):
+        if self._selection_callback is None:
+            self._selection_changes.clear()
+            return
+
+        if self._selection_callback_handle is not None:
+            self._selection_callback_handle.cancel()
+            self._selection_callback_handle = None
+
+        if self._selection_callback_delay:
+            loop = asyncio.get_running_loop()
+            self._selection_callback_handle = loop.call_later(self._selection_callback_delay,
+                                                              self._flush_selection_callback)
+        else:
+            self._flush_selection_callback()
+
+    def _flush_selection_callback(self):
+        """Call the selection callback with all items added/removed since its last call"""
+        if self._selection_callback_handle is not None:
+            self._selection_callback_handle.cancel()
+            self._selection_callback_handle = None
+
+        changes, self._selection_changes = self._selection_changes, {}
+        added = []
+        removed = []
+        for line, was_selected in changes.items():
+            is_selected = line in self._multi_selected
+            if is_selected != was_selected:
+                item = self._items[line]
+                (added if is_selected else removed).append((item.num, item.item))
+
+        if added or removed:
+            self._selection_callback(added, removed)
+            # the callback might have changed what we display
+            get_app().invalidate()
+
+    def _get_status_text(self):
+        return '\n'.join(text for text in (super()._get_status_text(), self._selection_error) if text)
 
     def _transform_prefix(self, item, lineno, prefix):
         if item.focusable:
@@ -448,6 +556,27 @@ class CliMultiMenu(CliMenu):
         if self._min_selection_count > self._item_num:
             raise ValueError("A minimum of {} items was requested for successful selection but only {} exist"
                              .format(self._min_selection_count, self._item_num))
+        if self._max_selection_count is not None:
+            if self._max_selection_count < self._min_selection_count:
+                raise ValueError("max_selection_count {} is smaller than min_selection_count {}"
+                                 .format(self._max_selection_count, self._min_selection_count))
+            if len(self._multi_selected) > self._max_selection_count:
+                raise ValueError("{} items are preselected but only a maximum of {} is allowed"
+                                 .format(len(self._multi_selected), self._max_selection_count))
+
+        # report the initial selection so the callback can start from an empty selection
+        if self._selection_callback is not None:
+            for line in self._multi_selected:
+                self._selection_changes.setdefault(line, False)
+            self._flush_selection_callback()
+
+    def _run(self):
+        try:
+            super()._run()
+        finally:
+            # deliver changes still waiting for their debounce timer
+            if self._selection_callback is not None:
+                self._flush_selection_callback()
 
     def _accept(self, event):
         if len(self._multi_selected) >= self._min_selection_count:
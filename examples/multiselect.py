@@ -15,3 +15,28 @@ m = CliMultiMenu(q, "Make your choice (<space> selects, <return> accepts):\n", c
 print("You selected", m.get_selection())
 print("You selected num:", m.get_selection_num())
 print("You selected item:", m.get_selection_item())
+
+
+# --- live selection total with a size budget ---
+sizes = {"host1": 20, "host2": 35, "host3": 50}
+budget = 80
+total = 0
+
+
+def check_budget(added, removed, selected):
+    size = sum(sizes[item] for _, item in selected + added)
+    if size > budget:
+        m.set_status("Selection would need {}GB, budget of {}GB exceeded".format(size, budget))
+        return False
+    return True
+
+
+def update_total(added, removed):
+    global total
+    total += sum(sizes[item] for _, item in added) - sum(sizes[item] for _, item in removed)
+    m.set_status("Selected disk size: {}GB".format(total))
+
+
+m = CliMultiMenu(sizes.keys(), "Select up to two hosts:\n", max_selection_count=2,
+                 selection_validator=check_budget, selection_callback=update_total)
+print("You selected", m.get_selection_item())
@@ -0,0 +1,100 @@
+import asyncio
+
+from clintermission import CliMultiMenu
+
+
+def _make_menu(calls, **kwargs):
+    kwargs.setdefault('selection_callback', lambda added, removed: calls.append((added, removed)))
+    menu = CliMultiMenu([("a", 1), ("b", 2, True), ("c", 3)], **kwargs)
+    menu._preflight()
+    return menu
+
+
+def test_initial_selection_reported_as_added():
+    calls = []
+    _make_menu(calls)
+    assert calls == [([(1, 2)], [])]
+
+
+def test_debounce_coalesces_changes():
+    calls = []
+    menu = _make_menu(calls, selection_callback_delay=0.05)
+
+    async def run():
+        assert menu._set_selected([0], True)
+        assert menu._set_selected([2], True)
+        assert menu._set_selected([1], False)
+        # toggled back within the debounce window, must not be reported
+        assert menu._set_selected([2], False)
+        assert calls == [([(1, 2)], [])]
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert calls == [([(1, 2)], []), ([(0, 1)], [(1, 2)])]
+
+
+def test_no_delay_calls_immediately():
+    calls = []
+    menu = _make_menu(calls, selection_callback_delay=0)
+    assert menu._set_selected([0, 2], True)
+    assert calls == [([(1, 2)], []), ([(0, 1), (2, 3)], [])]
+
+
+def test_pending_changes_flushed_on_exit():
+    calls = []
+    menu = _make_menu(calls, selection_callback_delay=10)
+
+    async def run():
+        assert menu._set_selected([0], True)
+
+    asyncio.run(run())
+    assert calls == [([(1, 2)], [])]
+    menu._flush_selection_callback()
+    assert calls == [([(1, 2)], []), ([(0, 1)], [])]
+
+
+def test_max_selection_count():
+    calls = []
+    menu = _make_menu(calls, max_selection_count=2, selection_callback_delay=0)
+    assert not menu._set_selected([0, 2], True)
+    assert list(menu._multi_selected) == [1]
+    assert menu._get_status_text() == "A maximum of 2 items can be selected"
+
+    assert menu._set_selected([0], True)
+    assert menu._get_status_text() == ""
+    assert calls == [([(1, 2)], []), ([(0, 1)], [])]
+
+
+def test_validator_gets_current_selection():
+    calls = []
+    validator_calls = []
+
+    def validator(added, removed, selected):
+        validator_calls.append((added, removed, selected))
+        return sum(item for _, item in selected + added) <= 4
+
+    menu = _make_menu(calls, selection_validator=validator, selection_callback_delay=10)
+
+    async def run():
+        assert menu._set_selected([0], True)
+        # only the debounced callback would not know about "a" being selected yet
+        assert not menu._set_selected([2], True)
+        assert menu._set_selected([0], False)
+
+    asyncio.run(run())
+    assert validator_calls == [
+        ([(0, 1)], [], [(1, 2)]),
+        ([(2, 3)], [], [(1, 2), (0, 1)]),
+        ([], [(0, 1)], [(1, 2), (0, 1)]),
+    ]
+    assert list(menu._multi_selected) == [1]
+
+
+def test_validator_refusal_clears_max_count_message():
+    calls = []
+    menu = _make_menu(calls, max_selection_count=1, selection_callback_delay=0,
+                      selection_validator=lambda added, removed, selected: False)
+    assert not menu._set_selected([0], True)
+    assert menu._get_status_text() == "A maximum of 1 items can be selected"
+    assert not menu._set_selected([1], False)
+    assert menu._get_status_text() == ""